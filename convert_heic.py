@@ -6,13 +6,18 @@ This script converts all HEIC files in the 'photos' directory to JPEG format.
 The converted files are saved in the same directory with .jpg extension.
 """
 
+import io
 import os
 import sys
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
 from pathlib import Path
 from PIL import Image
+import numpy as np
 import pillow_heif
+import simplejpeg
 import logging
-import magic
+import logging.handlers
 
 # Import additional libraries for fallback methods
 try:
@@ -27,25 +32,183 @@ try:
 except ImportError:
     IMAGEIO_AVAILABLE = False
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
+# Import numba for the compiled alpha-composite kernel
+try:
+    import numba
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+# Logging format, applied by the listener in the main process
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+logger = logging.getLogger(__name__)
+
+# File extensions recognized as HEIC/HEIF (compared in lowercase)
+HEIC_EXTENSIONS = ('.heic', '.heif')
+
+# Major brands in the ftyp header box that identify HEIC/HEIF files
+HEIC_BRANDS = frozenset({b'heic', b'heix', b'hevc', b'hevx', b'mif1', b'msf1'})
+
+# JPEG chroma subsampling for each HEVC chroma format pillow_heif reports,
+# so the JPEG keeps as much chroma detail as the source has and no more
+CHROMA_SUBSAMPLINGS = {420: '420', 422: '422', 444: '444'}
+
+# Subsampling used when the decoder doesn't report the source chroma; iPhone
+# HEIC files store 4:2:0
+JPEG_CHROMA_SUBSAMPLING = '420'
+
+def start_log_listener(log_queue):
+    """
+    Start the thread that writes queued log records to the console and log file.
+    
+    Args:
+        log_queue (multiprocessing.Queue): Queue that all processes log to
+        
+    Returns:
+        QueueListener: The running listener; call stop() to flush it
+    """
+    formatter = logging.Formatter(LOG_FORMAT)
+    handlers = [
         logging.StreamHandler(sys.stdout),
         logging.FileHandler('conversion.log')
     ]
-)
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    
+    listener = logging.handlers.QueueListener(log_queue, *handlers)
+    listener.start()
+    return listener
 
-logger = logging.getLogger(__name__)
+def configure_logging(log_queue):
+    """
+    Send this process's log records to the shared log queue.
+    
+    Args:
+        log_queue (multiprocessing.Queue): Queue read by the log listener
+    """
+    root_logger = logging.getLogger()
+    root_logger.handlers = [logging.handlers.QueueHandler(log_queue)]
+    root_logger.setLevel(logging.INFO)
 
-# Register HEIF opener with Pillow
-pillow_heif.register_heif_opener()
+def init_worker(log_queue, decode_threads=1):
+    """
+    Initialize a conversion worker process.
+    
+    Runs once per process in the pool so the HEIF opener is registered
+    a single time instead of on every conversion.
+    
+    Args:
+        log_queue (multiprocessing.Queue): Queue read by the log listener
+        decode_threads (int): Number of threads libheif may use per decode
+    """
+    configure_logging(log_queue)
+    
+    # Cap libheif's decode threads and numba's kernel threads so the pool
+    # doesn't oversubscribe the CPU
+    pillow_heif.options.DECODE_THREADS = decode_threads
+    if NUMBA_AVAILABLE:
+        numba.set_num_threads(min(decode_threads, numba.config.NUMBA_NUM_THREADS))
+    
+    # Depth maps (common in Portrait photos) and embedded thumbnails are never
+    # converted, so don't have pillow_heif collect them when opening files
+    pillow_heif.options.DEPTH_IMAGES = False
+    pillow_heif.options.THUMBNAILS = False
+    
+    # Register HEIF opener with Pillow
+    pillow_heif.register_heif_opener()
+
+def save_jpeg(image, output_path, quality=95, max_size=None, subsampling=JPEG_CHROMA_SUBSAMPLING):
+    """
+    Encode an RGB image as JPEG with libjpeg-turbo and write it to disk.
+    
+    Args:
+        image (Image or numpy.ndarray): RGB image to encode
+        output_path (Path): Path for the output JPEG file
+        quality (int): JPEG quality (1-100)
+        max_size (int): Longest allowed side in pixels, or None for full size
+        subsampling (str): simplejpeg chroma subsampling ('444', '422' or '420')
+    """
+    image_data = np.asarray(image)
+    
+    # Downscale images that are larger than max_size, keeping the aspect ratio
+    if max_size and max(image_data.shape[:2]) > max_size:
+        resized = Image.fromarray(image_data)
+        resized.thumbnail((max_size, max_size))
+        image_data = np.asarray(resized)
+    
+    jpeg_data = simplejpeg.encode_jpeg(
+        np.ascontiguousarray(image_data),
+        quality=quality,
+        colorspace='RGB',
+        colorsubsampling=subsampling,
+        fastdct=True,
+    )
+    
+    # Write the whole encoded buffer straight to the file descriptor; os.write
+    # may write less than requested, so loop until everything is written
+    fd = os.open(output_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+    try:
+        remaining = memoryview(jpeg_data)
+        while remaining:
+            remaining = remaining[os.write(fd, remaining):]
+    finally:
+        os.close(fd)
+
+if NUMBA_AVAILABLE:
+    @numba.njit(parallel=True, cache=True)
+    def composite_rows_on_white(image_data, blended):
+        """
+        Compiled kernel for composite_on_white, run in parallel over rows.
+        
+        Args:
+            image_data (numpy.ndarray): RGBA or LA pixel array
+            blended (numpy.ndarray): RGB output array of the same height and width
+        """
+        alpha_channel = image_data.shape[2] - 1
+        for y in numba.prange(image_data.shape[0]):
+            for x in range(image_data.shape[1]):
+                alpha = np.int32(image_data[y, x, alpha_channel])
+                for c in range(3):
+                    # LA images reuse their single gray channel for R, G and B
+                    color = np.int32(image_data[y, x, min(c, alpha_channel - 1)])
+                    blended[y, x, c] = (color * alpha + (255 - alpha) * 255 + 127) // 255
+
+def composite_on_white(image_data):
+    """
+    Composite an image with an alpha channel onto a white background.
+    
+    Uses the compiled numba kernel when numba is installed.
+    
+    Args:
+        image_data (numpy.ndarray): RGBA or LA pixel array
+        
+    Returns:
+        numpy.ndarray: RGB pixel array
+    """
+    if NUMBA_AVAILABLE:
+        blended = np.empty(image_data.shape[:2] + (3,), dtype=np.uint8)
+        composite_rows_on_white(image_data, blended)
+        return blended
+    
+    # Blend all channels in a single pass; 16 bits hold the largest sum (255 * 255 + 127)
+    alpha = image_data[..., -1:].astype(np.uint16)
+    color = image_data[..., :-1].astype(np.uint16)
+    blended = ((color * alpha + (255 - alpha) * 255 + 127) // 255).astype(np.uint8)
+    
+    # Broadcast grayscale (LA) images to three channels
+    if blended.shape[2] == 1:
+        blended = np.repeat(blended, 3, axis=2)
+    
+    return blended
 
 def is_heic_file(file_path):
     """
     Check if a file is actually a HEIC/HEIF file using multiple methods.
     
+    The checks run from cheapest to most expensive and stop at the first
+    one that recognizes the file.
+    
     Args:
         file_path (Path): Path to the file to check
         
@@ -54,33 +217,22 @@ def is_heic_file(file_path):
     """
     try:
         # Method 1: Check file extension
-        heic_extensions = {'.heic', '.heif', '.HEIC', '.HEIF'}
-        if file_path.suffix not in heic_extensions:
+        if file_path.suffix.lower() not in HEIC_EXTENSIONS:
             return False
         
-        # Method 2: Check file magic bytes/MIME type
-        try:
-            mime_type = magic.from_file(str(file_path), mime=True)
-            if mime_type in ['image/heic', 'image/heif', 'image/heic-sequence', 'image/heif-sequence']:
-                return True
-        except Exception as e:
-            logger.debug(f"Magic detection failed for {file_path.name}: {e}")
-        
-        # Method 3: Try to read file header manually
+        # Method 2: Read the file header manually
         try:
             with open(file_path, 'rb') as f:
                 header = f.read(12)
                 # HEIC files start with specific byte patterns
                 if len(header) >= 12:
-                    # Check for 'ftyp' at offset 4 and HEIC/HEIF identifiers
-                    if (header[4:8] == b'ftyp' and 
-                        (b'heic' in header or b'heix' in header or b'hevc' in header or 
-                         b'mif1' in header or b'msf1' in header)):
+                    # Check for 'ftyp' at offset 4 and a HEIC/HEIF major brand at offset 8
+                    if header[4:8] == b'ftyp' and header[8:12] in HEIC_BRANDS:
                         return True
         except Exception as e:
             logger.debug(f"Header check failed for {file_path.name}: {e}")
         
-        # Method 4: Try opening with pillow_heif directly
+        # Method 3: Try opening with pillow_heif directly
         try:
             heif_file = pillow_heif.open_heif(str(file_path))
             if heif_file:
@@ -94,14 +246,122 @@ def is_heic_file(file_path):
         logger.error(f"Error checking if {file_path.name} is HEIC: {e}")
         return False
 
-def convert_heic_to_jpeg(input_path, output_path, quality=95):
+def decode_with_pil(heic_data, max_size=None):
+    """
+    Decode a HEIC file with PIL and the pillow_heif plugin.
+    
+    Args:
+        heic_data (bytes): Contents of the HEIC file
+        max_size (int): Longest side the output will need, or None
+        
+    Returns:
+        tuple: RGB, RGBA or LA pixel array, and the source chroma
+            (420, 422 or 444) or None if unknown
+    """
+    with Image.open(io.BytesIO(heic_data)) as image:
+        # Downscale only: pillow_heif's image has no draft() support, so the
+        # full-resolution image is decoded first and then resized
+        if max_size:
+            image.thumbnail((max_size, max_size))
+        
+        return image_to_array(image), image.info.get('chroma')
+
+def decode_with_pillow_heif(heic_data, max_size=None):
+    """
+    Decode a HEIC file with pillow_heif directly.
+    
+    Args:
+        heic_data (bytes): Contents of the HEIC file
+        max_size (int): Unused; accepted for a uniform decoder signature
+        
+    Returns:
+        tuple: RGB or RGBA pixel array, and the source chroma (420, 422
+            or 444) or None if unknown
+    """
+    heif_file = pillow_heif.open_heif(io.BytesIO(heic_data), convert_hdr_to_8bit=True, bgr_mode=False)
+    if heif_file.mode not in ['RGB', 'RGBA']:
+        raise ValueError(f"Unsupported pillow_heif mode: {heif_file.mode}")
+    
+    # Expose the decoded pixels as a numpy array instead of copying them into a PIL image
+    return np.asarray(heif_file), heif_file.info.get('chroma')
+
+def decode_with_pyheif(heic_data, max_size=None):
+    """
+    Decode a HEIC file with pyheif.
+    
+    Args:
+        heic_data (bytes): Contents of the HEIC file
+        max_size (int): Unused; accepted for a uniform decoder signature
+        
+    Returns:
+        tuple: RGB, RGBA or LA pixel array, and None since pyheif doesn't
+            report the source chroma
+    """
+    heif_file = pyheif.read(heic_data)
+    image = Image.frombytes(
+        heif_file.mode,
+        heif_file.size,
+        heif_file.data,
+        "raw",
+        heif_file.mode,
+        heif_file.stride,
+    )
+    return image_to_array(image), None
+
+def decode_with_imageio(heic_data, max_size=None):
+    """
+    Decode a HEIC file with imageio.
+    
+    Args:
+        heic_data (bytes): Contents of the HEIC file
+        max_size (int): Unused; accepted for a uniform decoder signature
+        
+    Returns:
+        tuple: RGB or RGBA pixel array, and None since imageio doesn't
+            report the source chroma
+    """
+    image_data = imageio.imread(heic_data)
+    if image_data.ndim == 3 and image_data.shape[2] == 4:
+        return image_data, None
+    return image_to_array(Image.fromarray(image_data)), None
+
+def image_to_array(image):
+    """
+    Get the pixels of a PIL image as a numpy array, keeping any alpha channel.
+    
+    Args:
+        image (Image): Decoded image
+        
+    Returns:
+        numpy.ndarray: RGB, RGBA or LA pixel array
+    """
+    if image.mode not in ['RGB', 'RGBA', 'LA']:
+        image = image.convert('RGB')
+    return np.asarray(image)
+
+# Decoding methods tried in order until one succeeds
+DECODERS = [
+    ('PIL method', decode_with_pil),
+    ('direct pillow_heif', decode_with_pillow_heif),
+]
+if PYHEIF_AVAILABLE:
+    DECODERS.append(('pyheif method', decode_with_pyheif))
+if IMAGEIO_AVAILABLE:
+    DECODERS.append(('imageio method', decode_with_imageio))
+
+def convert_heic_to_jpeg(input_path, output_path, quality=95, max_size=None):
     """
     Convert a single HEIC file to JPEG format using multiple fallback methods.
     
+    The input is expected to have been validated with is_heic_file already,
+    as get_heic_files does.
+    
     Args:
         input_path (Path): Path to the input HEIC file
         output_path (Path): Path for the output JPEG file
         quality (int): JPEG quality (1-100)
+        max_size (int): Longest allowed side in pixels, or None to keep
+            the full resolution
     
     Returns:
         bool: True if conversion successful, False otherwise
@@ -109,177 +369,102 @@ def convert_heic_to_jpeg(input_path, output_path, quality=95):
     conversion_methods = []
     
     try:
-        # First, validate that this is actually a HEIC file
-        if not is_heic_file(input_path):
-            logger.error(f"File {input_path.name} is not a valid HEIC file")
-            return False
+        # Read the file once; every decoder works from the same bytes
+        try:
+            heic_data = input_path.read_bytes()
+        except FileNotFoundError:
+            heic_data = b''
         
         # Check file size and readability
-        if not input_path.exists() or input_path.stat().st_size == 0:
+        if not heic_data:
             logger.error(f"File {input_path.name} is empty or does not exist")
             return False
         
-        # Method 1: Try with PIL and pillow_heif (standard approach)
-        try:
-            with Image.open(input_path) as image:
-                # Handle different color modes
-                if image.mode in ['RGBA', 'LA']:
-                    # Create white background for transparency
-                    background = Image.new('RGB', image.size, (255, 255, 255))
-                    if image.mode == 'RGBA':
-                        background.paste(image, mask=image.split()[-1])
-                    else:
-                        background.paste(image, mask=image.split()[-1])
-                    image = background
-                elif image.mode != 'RGB':
-                    image = image.convert('RGB')
-                
-                # Save as JPEG
-                image.save(output_path, 'JPEG', quality=quality, optimize=True)
-                
-            logger.info(f"Successfully converted (PIL method): {input_path.name} -> {output_path.name}")
-            return True
-            
-        except Exception as pil_error:
-            conversion_methods.append(f"PIL method failed: {pil_error}")
-            logger.debug(f"PIL conversion failed for {input_path.name}: {pil_error}")
-            
-            # Method 2: Try direct pillow_heif with improved error handling
+        # Try each decoder in turn
+        for method_name, decode in DECODERS:
             try:
-                heif_file = pillow_heif.open_heif(str(input_path), convert_hdr_to_8bit=True, bgr_mode=False)
-                
-                # Try to get the primary image if multiple images exist
-                if hasattr(heif_file, 'primary_image'):
-                    heif_data = heif_file.primary_image()
-                else:
-                    heif_data = heif_file
-                
-                # Create PIL image with proper handling
-                image = Image.frombytes(
-                    heif_data.mode,
-                    heif_data.size,
-                    heif_data.data,
-                    "raw",
-                )
-                
-                # Handle different color modes
-                if image.mode in ['RGBA', 'LA']:
-                    background = Image.new('RGB', image.size, (255, 255, 255))
-                    if image.mode == 'RGBA':
-                        background.paste(image, mask=image.split()[-1])
-                    else:
-                        background.paste(image, mask=image.split()[-1])
-                    image = background
-                elif image.mode != 'RGB':
-                    image = image.convert('RGB')
-                
-                # Save as JPEG
-                image.save(output_path, 'JPEG', quality=quality, optimize=True)
-                
-                logger.info(f"Successfully converted (direct pillow_heif): {input_path.name} -> {output_path.name}")
-                return True
-                
-            except Exception as direct_error:
-                conversion_methods.append(f"Direct pillow_heif failed: {direct_error}")
-                logger.debug(f"Direct pillow_heif failed for {input_path.name}: {direct_error}")
-                
-                # Method 3: Try with pyheif if available
-                if PYHEIF_AVAILABLE:
-                    try:
-                        heif_file = pyheif.read(str(input_path))
-                        image = Image.frombytes(
-                            heif_file.mode,
-                            heif_file.size,
-                            heif_file.data,
-                            "raw",
-                            heif_file.mode,
-                            heif_file.stride,
-                        )
-                        
-                        # Handle color modes
-                        if image.mode in ['RGBA', 'LA']:
-                            background = Image.new('RGB', image.size, (255, 255, 255))
-                            if image.mode == 'RGBA':
-                                background.paste(image, mask=image.split()[-1])
-                            else:
-                                background.paste(image, mask=image.split()[-1])
-                            image = background
-                        elif image.mode != 'RGB':
-                            image = image.convert('RGB')
-                        
-                        image.save(output_path, 'JPEG', quality=quality, optimize=True)
-                        
-                        logger.info(f"Successfully converted (pyheif method): {input_path.name} -> {output_path.name}")
-                        return True
-                        
-                    except Exception as pyheif_error:
-                        conversion_methods.append(f"pyheif method failed: {pyheif_error}")
-                        logger.debug(f"pyheif conversion failed for {input_path.name}: {pyheif_error}")
-                
-                # Method 4: Try with imageio if available
-                if IMAGEIO_AVAILABLE:
-                    try:
-                        # Read with imageio
-                        image_data = imageio.imread(str(input_path))
-                        
-                        # Convert numpy array to PIL Image
-                        if len(image_data.shape) == 3 and image_data.shape[2] == 4:
-                            # Handle RGBA
-                            image = Image.fromarray(image_data, 'RGBA')
-                            background = Image.new('RGB', image.size, (255, 255, 255))
-                            background.paste(image, mask=image.split()[-1])
-                            image = background
-                        else:
-                            image = Image.fromarray(image_data)
-                            if image.mode != 'RGB':
-                                image = image.convert('RGB')
-                        
-                        image.save(output_path, 'JPEG', quality=quality, optimize=True)
-                        
-                        logger.info(f"Successfully converted (imageio method): {input_path.name} -> {output_path.name}")
-                        return True
-                        
-                    except Exception as imageio_error:
-                        conversion_methods.append(f"imageio method failed: {imageio_error}")
-                        logger.debug(f"imageio conversion failed for {input_path.name}: {imageio_error}")
-                
-                # All methods failed
-                logger.error(f"All conversion methods failed for {input_path.name}:")
-                for i, method_error in enumerate(conversion_methods, 1):
-                    logger.error(f"  Method {i}: {method_error}")
-                return False
+                image_data, chroma = decode(heic_data, max_size)
+                break
+            except Exception as e:
+                conversion_methods.append(f"{method_name} failed: {e}")
+                logger.debug(f"{method_name} failed for {input_path.name}: {e}")
+        else:
+            # All methods failed
+            logger.error(f"All conversion methods failed for {input_path.name}:")
+            for i, method_error in enumerate(conversion_methods, 1):
+                logger.error(f"  Method {i}: {method_error}")
+            return False
+        
+        # Composite onto a white background for transparency
+        if image_data.shape[2] in [2, 4]:
+            image_data = composite_on_white(image_data)
+        
+        # Save as JPEG, matching the source's chroma subsampling when known
+        subsampling = CHROMA_SUBSAMPLINGS.get(chroma, JPEG_CHROMA_SUBSAMPLING)
+        save_jpeg(image_data, output_path, quality, max_size, subsampling)
+        
+        logger.info(f"Successfully converted ({method_name}): {input_path.name} -> {output_path.name}")
+        return True
         
     except Exception as e:
         logger.error(f"Unexpected error converting {input_path.name}: {str(e)}")
         return False
 
-def get_heic_files(directory):
+def iter_heic_files(directory):
     """
-    Get all HEIC files from the specified directory.
+    Yield the HEIC files in the specified directory as they are found.
+    
+    Files are yielded in directory order so conversions can start before
+    the whole directory has been scanned.
     
     Args:
         directory (Path): Directory to search for HEIC files
         
-    Returns:
-        list: List of Path objects for HEIC files
+    Yields:
+        Path: Path of each valid HEIC file
     """
-    heic_files = []
-    
-    for file_path in directory.iterdir():
-        if file_path.is_file():
+    # DirEntry caches the file type from the directory listing, so this
+    # avoids a stat() call per file
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if not entry.is_file() or not entry.name.lower().endswith(HEIC_EXTENSIONS):
+                continue
+            
             # Use our robust HEIC detection
+            file_path = Path(entry.path)
             if is_heic_file(file_path):
-                heic_files.append(file_path)
+                yield file_path
             else:
                 # Log files that have HEIC extensions but aren't valid HEIC files
-                heic_extensions = {'.heic', '.heif', '.HEIC', '.HEIF'}
-                if file_path.suffix in heic_extensions:
-                    logger.warning(f"File {file_path.name} has HEIC extension but is not a valid HEIC file")
+                logger.warning(f"File {file_path.name} has HEIC extension but is not a valid HEIC file")
+
+def conversion_succeeded(future, heic_file):
+    """
+    Get the result of a finished conversion, logging any worker failure.
     
-    return sorted(heic_files)
+    Args:
+        future (Future): Finished convert_heic_to_jpeg call
+        heic_file (Path): HEIC file the call converted
+        
+    Returns:
+        bool: True if conversion successful, False otherwise
+    """
+    try:
+        return future.result()
+    except Exception as e:
+        logger.error(f"Worker failed while converting {heic_file.name}: {e}")
+        return False
 
-def main():
-    """Main function to convert all HEIC files in the photos directory."""
+def convert_photos(log_queue):
+    """
+    Convert all HEIC files in the photos directory.
+    
+    Args:
+        log_queue (multiprocessing.Queue): Queue read by the log listener
+        
+    Returns:
+        int: Number of failed conversions
+    """
     
     # Log available conversion methods
     available_methods = ["pillow_heif + PIL"]
@@ -302,40 +487,91 @@ def main():
         logger.error(f"Photos path is not a directory: {photos_dir}")
         sys.exit(1)
     
-    # Get all HEIC files
-    heic_files = get_heic_files(photos_dir)
+    # List existing JPEGs once instead of checking each output path. Names are
+    # compared in lowercase because photos bind-mounted from macOS or Windows
+    # are case-insensitive, where writing IMG_1234.jpg would overwrite IMG_1234.JPG
+    with os.scandir(photos_dir) as entries:
+        file_names = [entry.name.lower() for entry in entries]
+    existing_jpegs = {name for name in file_names if name.endswith(('.jpg', '.jpeg'))}
     
-    if not heic_files:
-        logger.info("No HEIC files found in the photos directory.")
-        return
+    # Count the HEIC files that still need converting, to size the pool
+    candidate_count = sum(
+        1 for name in file_names
+        if name.endswith(HEIC_EXTENSIONS) and os.path.splitext(name)[0] + '.jpg' not in existing_jpegs
+    )
     
-    logger.info(f"Found {len(heic_files)} HEIC files to convert.")
+    # Convert the files in parallel with up to one worker process per CPU core,
+    # splitting the cores between workers for libheif's decode threads.
+    # Files are submitted as the directory scan finds them, with at most two
+    # conversions per worker in flight: one running and about one queued.
+    cpu_count = os.cpu_count() or 1
+    worker_count = max(1, min(cpu_count, candidate_count))
+    decode_threads = max(1, cpu_count // worker_count)
+    max_pending = 2 * worker_count
     
-    # Convert each HEIC file
-    successful_conversions = 0
-    failed_conversions = 0
+    found_files = 0
+    results = []
     
-    for heic_file in heic_files:
-        # Create output filename (replace extension with .jpg)
-        jpeg_filename = heic_file.stem + '.jpg'
-        jpeg_path = photos_dir / jpeg_filename
+    with ProcessPoolExecutor(max_workers=worker_count, initializer=init_worker,
+                             initargs=(log_queue, decode_threads)) as executor:
+        pending = {}
         
-        # Skip if JPEG already exists
-        if jpeg_path.exists():
-            logger.info(f"JPEG already exists, skipping: {jpeg_filename}")
-            continue
+        for heic_file in iter_heic_files(photos_dir):
+            found_files += 1
+            
+            # Create output filename (replace extension with .jpg)
+            jpeg_filename = heic_file.stem + '.jpg'
+            jpeg_path = photos_dir / jpeg_filename
+            
+            # Skip if JPEG already exists
+            if jpeg_filename.lower() in existing_jpegs:
+                logger.info(f"JPEG already exists, skipping: {jpeg_filename}")
+                continue
+            
+            # Wait for a conversion to finish when the queue is full
+            if len(pending) >= max_pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results.append(conversion_succeeded(future, pending.pop(future)))
+            
+            pending[executor.submit(convert_heic_to_jpeg, heic_file, jpeg_path)] = heic_file
+            
+            # Claim the output name so another source with the same stem
+            # (e.g. A.HEIC and a.heif) is skipped instead of racing to write it
+            existing_jpegs.add(jpeg_filename.lower())
         
-        # Convert the file
-        if convert_heic_to_jpeg(heic_file, jpeg_path):
-            successful_conversions += 1
-        else:
-            failed_conversions += 1
+        for future in as_completed(pending):
+            results.append(conversion_succeeded(future, pending[future]))
+    
+    if not found_files:
+        logger.info("No HEIC files found in the photos directory.")
+        return 0
+    
+    successful_conversions = sum(results)
+    failed_conversions = len(results) - successful_conversions
     
     # Log summary
     logger.info(f"Conversion complete!")
+    logger.info(f"HEIC files found: {found_files}")
     logger.info(f"Successful conversions: {successful_conversions}")
     logger.info(f"Failed conversions: {failed_conversions}")
     
+    return failed_conversions
+
+def main():
+    """Main function to convert all HEIC files in the photos directory."""
+    
+    # Route log records from every process through one queue so a single
+    # listener thread owns the console and log file
+    log_queue = multiprocessing.Queue(-1)
+    listener = start_log_listener(log_queue)
+    configure_logging(log_queue)
+    
+    try:
+        failed_conversions = convert_photos(log_queue)
+    finally:
+        listener.stop()
+    
     if failed_conversions > 0:
         sys.exit(1)
 
@@ -6,138 +6,200 @@ This script helps diagnose issues with HEIC files and provides detailed informat
 about what might be preventing conversion.
 """
 
+import io
+import multiprocessing
+import os
 import sys
 from pathlib import Path
-from PIL import Image
 import pillow_heif
 import logging
 
-# Configure logging for detailed output
-logging.basicConfig(level=logging.DEBUG, format='%(levelname)s: %(message)s')
-logger = logging.getLogger(__name__)
+# File extensions recognized as HEIC/HEIF (compared in lowercase)
+HEIC_EXTENSIONS = ('.heic', '.heif')
 
-# Register HEIF opener
-pillow_heif.register_heif_opener()
+# MIME types for the major brands found in an ISO BMFF 'ftyp' box
+BRAND_MIME_TYPES = {
+    b'heic': 'image/heic',
+    b'heix': 'image/heic',
+    b'hevc': 'image/heic-sequence',
+    b'hevx': 'image/heic-sequence',
+    b'mif1': 'image/heif',
+    b'msf1': 'image/heif-sequence',
+    b'avif': 'image/avif',
+}
+
+# MIME types for the magic numbers of common non-HEIC formats, which often
+# turn up as JPEG or PNG files renamed to .HEIC
+SIGNATURE_MIME_TYPES = (
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'GIF8', 'image/gif'),
+)
+
+# Major brands that identify HEIC/HEIF files, taken from the table above so
+# the brand and MIME type checks always agree
+HEIC_BRANDS = frozenset(
+    brand for brand, mime_type in BRAND_MIME_TYPES.items()
+    if mime_type.startswith(('image/heic', 'image/heif'))
+)
+
+# Rule printed above and below each file's report heading
+SEPARATOR = '=' * 60
+
+def init_worker(decode_threads=1, debug=False):
+    """Register and configure the HEIF opener once per diagnosing process."""
+    # Library debug logging is slow and noisy, so only enable it on request
+    if debug:
+        logging.basicConfig(level=logging.DEBUG, format='%(levelname)s: %(message)s')
+    
+    # Thumbnails and depth images aren't needed for diagnosis
+    pillow_heif.register_heif_opener(thumbnails=False, depth_images=False, decode_threads=decode_threads)
+
+def join_report(lines):
+    """Join report lines into a single newline-terminated string."""
+    return '\n'.join(lines) + '\n'
 
 def diagnose_heic_file(file_path):
-    """Diagnose a single HEIC file and report all findings."""
+    """
+    Diagnose a single HEIC file and report all findings.
+    
+    The report lines are collected and returned as one string, so output
+    from parallel workers doesn't interleave and is written in one call.
+    """
     
-    print(f"\n{'='*60}")
-    print(f"DIAGNOSING: {file_path}")
-    print(f"{'='*60}")
+    lines = []
+    
+    lines.append(f"\n{SEPARATOR}")
+    lines.append(f"DIAGNOSING: {file_path}")
+    lines.append(SEPARATOR)
     
     # Basic file checks
     if not file_path.exists():
-        print("❌ File does not exist")
-        return
+        lines.append("❌ File does not exist")
+        return join_report(lines)
     
     if not file_path.is_file():
-        print("❌ Path is not a file")
-        return
+        lines.append("❌ Path is not a file")
+        return join_report(lines)
+    
+    # Read the file once; the header check and both decoders reuse the bytes
+    try:
+        file_data = file_path.read_bytes()
+    except OSError as e:
+        lines.append(f"❌ File could not be read: {e}")
+        return join_report(lines)
     
-    file_size = file_path.stat().st_size
-    print(f"✅ File exists and is {file_size:,} bytes")
+    file_size = len(file_data)
+    lines.append(f"✅ File exists and is {file_size:,} bytes")
     
     if file_size == 0:
-        print("❌ File is empty")
-        return
+        lines.append("❌ File is empty")
+        return join_report(lines)
     
     # Extension check
-    print(f"📁 Extension: {file_path.suffix}")
-    heic_extensions = {'.heic', '.heif', '.HEIC', '.HEIF'}
-    if file_path.suffix in heic_extensions:
-        print("✅ Has HEIC extension")
+    lines.append(f"📁 Extension: {file_path.suffix}")
+    if file_path.suffix.lower() in HEIC_EXTENSIONS:
+        lines.append("✅ Has HEIC extension")
     else:
-        print("⚠️  Does not have HEIC extension")
-    
-    # Try to detect MIME type
-    try:
-        import magic
-        mime_type = magic.from_file(str(file_path), mime=True)
-        print(f"🔍 MIME type: {mime_type}")
-        
-        if mime_type in ['image/heic', 'image/heif', 'image/heic-sequence', 'image/heif-sequence']:
-            print("✅ MIME type indicates HEIC/HEIF")
-        else:
-            print("⚠️  MIME type does not indicate HEIC/HEIF")
-    except ImportError:
-        print("⚠️  python-magic not available for MIME detection")
-    except Exception as e:
-        print(f"❌ MIME detection failed: {e}")
+        lines.append("⚠️  Does not have HEIC extension")
     
     # Check file header
-    try:
-        with open(file_path, 'rb') as f:
-            header = f.read(20)
-            print(f"🔍 File header (hex): {header[:20].hex()}")
-            print(f"🔍 File header (ascii): {header[:20]}")
+    header = file_data[:20]
+    lines.append(f"🔍 File header (hex): {header[:20].hex()}")
+    lines.append(f"🔍 File header (ascii): {header[:20]}")
+    
+    has_ftyp = False
+    if len(header) >= 12:
+        if header[4:8] == b'ftyp':
+            lines.append("✅ Has 'ftyp' signature at offset 4")
+            has_ftyp = True
             
-            if len(header) >= 12:
-                if header[4:8] == b'ftyp':
-                    print("✅ Has 'ftyp' signature at offset 4")
-                    
-                    # Check for HEIC identifiers
-                    heic_markers = [b'heic', b'heix', b'hevc', b'mif1', b'msf1']
-                    found_markers = [marker for marker in heic_markers if marker in header]
-                    if found_markers:
-                        print(f"✅ Found HEIC markers: {found_markers}")
-                    else:
-                        print("❌ No HEIC markers found in header")
-                else:
-                    print("❌ No 'ftyp' signature found")
-    except Exception as e:
-        print(f"❌ Header analysis failed: {e}")
+            # Detect the MIME type from the major brand at offset 8
+            brand = header[8:12]
+            mime_type = BRAND_MIME_TYPES.get(brand, 'unknown')
+            lines.append(f"🔍 MIME type: {mime_type}")
+            
+            if brand in HEIC_BRANDS:
+                lines.append(f"✅ Found HEIC brand: {brand}")
+            else:
+                lines.append(f"❌ Brand {brand} does not indicate HEIC/HEIF")
+        else:
+            lines.append("❌ No 'ftyp' signature found")
+    
+    # Without an 'ftyp' box, name the real format if the header shows one
+    if not has_ftyp:
+        for signature, mime_type in SIGNATURE_MIME_TYPES:
+            if header.startswith(signature):
+                lines.append(f"🔍 MIME type: {mime_type}")
+                break
+    
+    # Without an ISO BMFF 'ftyp' box decoding can only fail, and libheif may
+    # parse the whole file before it does, so stop here. Unknown brands are
+    # still decoded, since the converter may accept them as well.
+    if not has_ftyp:
+        lines.append("\n⏭️  Skipping decode tests: no 'ftyp' box in header")
+        return join_report(lines)
     
     # Try pillow_heif directly
-    print("\n🔧 Testing pillow_heif direct access...")
+    lines.append("\n🔧 Testing pillow_heif direct access...")
+    heif_file = None
     try:
-        heif_file = pillow_heif.open_heif(str(file_path))
+        heif_file = pillow_heif.open_heif(io.BytesIO(file_data))
         if heif_file:
-            print(f"✅ pillow_heif can open file")
-            print(f"   Mode: {heif_file.mode}")
-            print(f"   Size: {heif_file.size}")
-            print(f"   Has alpha: {heif_file.has_alpha}")
+            lines.append(f"✅ pillow_heif can open file")
+            lines.append(f"   Mode: {heif_file.mode}")
+            lines.append(f"   Size: {heif_file.size}")
+            lines.append(f"   Has alpha: {heif_file.has_alpha}")
         else:
-            print("❌ pillow_heif returned None")
+            lines.append("❌ pillow_heif returned None")
     except Exception as e:
-        print(f"❌ pillow_heif failed: {e}")
+        lines.append(f"❌ pillow_heif failed: {e}")
+    
+    # Try PIL with the image pillow_heif already opened, so the file is only decoded once
+    lines.append("\n🔧 Testing PIL with pillow_heif...")
+    if not heif_file:
+        lines.append("❌ PIL skipped: pillow_heif could not open file")
+        return join_report(lines)
     
-    # Try PIL with pillow_heif
-    print("\n🔧 Testing PIL with pillow_heif...")
     try:
-        with Image.open(file_path) as image:
-            print(f"✅ PIL can open file")
-            print(f"   Format: {image.format}")
-            print(f"   Mode: {image.mode}")
-            print(f"   Size: {image.size}")
+        image = heif_file.to_pillow()
+        lines.append("✅ PIL can load the decoded image")
+        lines.append(f"   MIME type: {heif_file.mimetype}")
+        lines.append(f"   Mode: {image.mode}")
+        lines.append(f"   Size: {image.size}")
         
-        # Try a test conversion
-        print("\n🔧 Testing conversion...")
-        test_output = file_path.parent / f"{file_path.stem}_test.jpg"
+        # Try a test conversion, reusing the decoded image
+        lines.append("\n🔧 Testing conversion...")
         try:
-            with Image.open(file_path) as image:
-                if image.mode != 'RGB':
-                    image = image.convert('RGB')
-                image.save(test_output, 'JPEG', quality=95)
-            print(f"✅ Test conversion successful: {test_output}")
+            # Encode into memory; only whether encoding succeeds matters here
+            jpeg_buffer = io.BytesIO()
+            rgb_image = image.convert('RGB') if image.mode != 'RGB' else image
+            rgb_image.save(jpeg_buffer, 'JPEG', quality=85, optimize=False, progressive=False)
+            if jpeg_buffer.tell() > 0:
+                lines.append(f"✅ Test conversion successful ({jpeg_buffer.tell():,} bytes of JPEG)")
+            else:
+                lines.append("❌ Test conversion produced no JPEG data")
             
-            # Clean up test file
-            if test_output.exists():
-                test_output.unlink()
-                
         except Exception as conv_e:
-            print(f"❌ Test conversion failed: {conv_e}")
+            lines.append(f"❌ Test conversion failed: {conv_e}")
             
     except Exception as e:
-        print(f"❌ PIL failed: {e}")
+        lines.append(f"❌ PIL failed: {e}")
+    
+    return join_report(lines)
 
 def main():
     """Main function to diagnose HEIC files."""
     
-    if len(sys.argv) > 1:
+    # Arguments starting with '--' are flags; anything else is a file path
+    debug = '--debug' in sys.argv
+    file_args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    
+    if file_args:
         # Diagnose specific file
-        file_path = Path(sys.argv[1])
-        diagnose_heic_file(file_path)
+        file_path = Path(file_args[0])
+        init_worker(decode_threads=os.cpu_count() or 1, debug=debug)
+        sys.stdout.write(diagnose_heic_file(file_path))
     else:
         # Diagnose all HEIC files in photos directory
         photos_dir = Path('/app/photos') if Path('/app/photos').exists() else Path('./photos')
@@ -146,9 +208,10 @@ def main():
             print(f"Photos directory not found: {photos_dir}")
             sys.exit(1)
         
-        heic_extensions = {'.heic', '.heif', '.HEIC', '.HEIF'}
-        heic_files = [f for f in photos_dir.iterdir() 
-                     if f.is_file() and f.suffix in heic_extensions]
+        # DirEntry caches the file type, so this avoids a stat() per file
+        with os.scandir(photos_dir) as entries:
+            heic_files = [Path(entry.path) for entry in entries
+                          if entry.is_file() and entry.name.lower().endswith(HEIC_EXTENSIONS)]
         
         if not heic_files:
             print("No HEIC files found in photos directory")
@@ -156,8 +219,16 @@ def main():
         
         print(f"Found {len(heic_files)} potential HEIC files")
         
-        for heic_file in heic_files:
-            diagnose_heic_file(heic_file)
+        # Diagnose files in parallel, printing each report as a whole in order.
+        # The cores are split between the workers for libheif's decode threads.
+        cpu_count = os.cpu_count() or 1
+        pool_size = min(cpu_count, len(heic_files))
+        decode_threads = max(1, cpu_count // pool_size)
+        
+        with multiprocessing.Pool(processes=pool_size, initializer=init_worker,
+                                  initargs=(decode_threads, debug)) as pool:
+            for report in pool.imap(diagnose_heic_file, heic_files):
+                sys.stdout.write(report)
 
 if __name__ == "__main__":
     main()